@@ -1,14 +1,22 @@
 import json
-import sqlite3
 from pathlib import Path
 from datetime import datetime
-from joblib import load
+
+from predictive_module.compact_scorer import COMPACT_PATH, load_compact, predict_proba
+from price_history import record_price_change
+from schema import connect
 
 DB_PATH = "insurance.db"
 VEC_PATH = Path("models/tfidf.joblib")
 MODEL_PATH = Path("models/risk_model.joblib")
 STATE_PATH = Path("predictive_module/model_state.json")
 
+# Optimistic concurrency: how many times to re-read and retry the
+# compare-and-set when another writer changed the product in between.
+MAX_CAS_RETRIES = 5
+# Seconds to wait on SQLite's write lock before giving up.
+LOCK_TIMEOUT = 5.0
+
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
@@ -27,10 +35,16 @@ def get_model_version():
     except Exception:
         return "v?"
 
-def compute_factor(conn, n_docs=10):
+def score_texts(texts):
+    # Prefer the compact export: no sklearn import or object unpickling.
+    if COMPACT_PATH.exists():
+        return predict_proba(load_compact(COMPACT_PATH), texts)
+    from joblib import load
     vectorizer = load(VEC_PATH)
     model = load(MODEL_PATH)
+    return model.predict_proba(vectorizer.transform(texts))[:, 1]
 
+def compute_factor(conn, n_docs=10):
     cur = conn.cursor()
     cur.execute("""
         SELECT doc_id, storage_location, timestamp
@@ -51,51 +65,103 @@ def compute_factor(conn, n_docs=10):
     if not texts:
         raise ValueError("No readable text documents found to compute risk.")
 
-    X = vectorizer.transform(texts)
-    probs = model.predict_proba(X)[:, 1]
+    probs = score_texts(texts)
     avg_risk = float(probs.mean())
 
     factor = 1.0 + clamp(avg_risk, 0.0, 0.25)
     return avg_risk, factor, used
 
-def main(product_id=1, policy_id=1, customer_id=1):
-    if not VEC_PATH.exists() or not MODEL_PATH.exists():
-        raise FileNotFoundError("Model artifacts missing. Run train_or_retrain first.")
-
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cur = conn.cursor()
-
-    # Read old price
-    cur.execute("SELECT product_name, base_price FROM Product WHERE product_id=?", (product_id,))
+def read_product(conn, product_id):
+    cur = conn.execute(
+        "SELECT product_name, base_price, version, last_repriced_by FROM Product WHERE product_id=?",
+        (product_id,),
+    )
     row = cur.fetchone()
     if not row:
         raise ValueError(f"Product {product_id} not found.")
-    product_name, old_price = row
-    if old_price is None:
+    if row[1] is None:
         raise ValueError("Product.base_price is NULL. Set an initial base_price first.")
-
-    avg_risk, factor, doc_ids = compute_factor(conn)
-    new_price = round(float(old_price) * factor, 2)
-
-    # Update price
-    cur.execute("UPDATE Product SET base_price=? WHERE product_id=?", (new_price, product_id))
-
-    # Log explanation
-    model_version = get_model_version()
-    note = (
-        f"Predictive pricing update ({model_version}). "
-        f"Computed avg_high_risk_prob={avg_risk:.3f} from docs={doc_ids}. "
-        f"Applied factor={factor:.3f} to Product '{product_name}' base_price: {old_price} -> {new_price}."
+    return row
+
+def write_price(conn, product_id, product, factor, reprice_key, model_version, note_prefix, policy_id, customer_id):
+    # product is the row read before the factor was computed. Short write
+    # section: BEGIN IMMEDIATE takes the write lock up front, and the UPDATE
+    # only succeeds if nobody changed the product since that read.
+    # Returns (old_price, new_price), or None if the same reprice already won.
+    product_name, old_price, version, last_key = product
+    for _ in range(MAX_CAS_RETRIES):
+        new_price = round(float(old_price) * factor, 2)
+        note = f"{note_prefix} Applied factor={factor:.3f} to Product '{product_name}' base_price: {old_price} -> {new_price}."
+
+        conn.execute("BEGIN IMMEDIATE;")
+        try:
+            cur = conn.execute("""
+                UPDATE Product SET base_price=?, version=version+1, last_repriced_by=?
+                WHERE product_id=? AND version=? AND base_price=?
+            """, (new_price, reprice_key, product_id, version, old_price))
+            if cur.rowcount == 1:
+                now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                record_price_change(conn, product_id, old_price, new_price, now, model_version)
+                conn.execute("""
+                    INSERT INTO Activity(policy_id, customer_id, activity_type, activity_timestamp, notes)
+                    VALUES (?, ?, 'PricingUpdatedByPredictiveModel', ?, ?)
+                """, (policy_id, customer_id, now, note))
+                conn.execute("COMMIT;")
+                return old_price, new_price
+            conn.execute("ROLLBACK;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            raise
+
+        # Lost the race: never re-apply the factor on top of another reprice.
+        _, cur_price, cur_version, cur_key = read_product(conn, product_id)
+        if cur_key == reprice_key:
+            return None
+        if cur_key != last_key:
+            raise RuntimeError(
+                f"Product {product_id} was repriced concurrently ({cur_key}); "
+                "pricing update aborted to avoid compounding factors."
+            )
+        # Non-pricing edit (manual price or other column change): retry on it.
+        old_price, version = cur_price, cur_version
+
+    raise RuntimeError(
+        f"Product {product_id} changed concurrently {MAX_CAS_RETRIES} times; pricing update aborted."
     )
-    cur.execute("""
-        INSERT INTO Activity(policy_id, customer_id, activity_type, activity_timestamp, notes)
-        VALUES (?, ?, 'PricingUpdatedByPredictiveModel', ?, ?)
-    """, (policy_id, customer_id, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), note))
 
-    conn.commit()
-    conn.close()
+def main(product_id=1, policy_id=1, customer_id=1):
+    # Either the compact export or the joblib pair is enough to score.
+    if not COMPACT_PATH.exists() and not (VEC_PATH.exists() and MODEL_PATH.exists()):
+        raise FileNotFoundError("Model artifacts missing. Run train_or_retrain first.")
 
+    # Autocommit mode: reads and inference below run outside any transaction,
+    # so repricing never holds a lock while the model is scoring.
+    conn = connect(DB_PATH, timeout=LOCK_TIMEOUT, isolation_level=None)
+    try:
+        product = read_product(conn, product_id)
+        product_name = product[0]
+        avg_risk, factor, doc_ids = compute_factor(conn)
+
+        model_version = get_model_version()
+        reprice_key = f"{model_version} docs={doc_ids}"
+        result = None
+        if product[3] != reprice_key:
+            note_prefix = (
+                f"Predictive pricing update ({model_version}). "
+                f"Computed avg_high_risk_prob={avg_risk:.3f} from docs={doc_ids}."
+            )
+            result = write_price(
+                conn, product_id, product, factor, reprice_key, model_version, note_prefix, policy_id, customer_id
+            )
+    finally:
+        conn.close()
+
+    if result is None:
+        print("✅ Pricing already up to date")
+        print(f"Product: {product_name} (product_id={product_id}) was already repriced by {reprice_key}.")
+        return
+
+    old_price, new_price = result
     print("✅ Transactional pricing updated successfully")
     print(f"Product: {product_name} (product_id={product_id})")
     print(f"Old base_price={old_price} -> New base_price={new_price} (factor={factor:.3f})")
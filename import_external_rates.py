@@ -1,9 +1,10 @@
 import csv
-import sqlite3
+
+from schema import connect
 
 DB = "insurance.db"
 
-conn = sqlite3.connect(DB)
+conn = connect(DB)
 cur = conn.cursor()
 
 with open("data/external_cancer_rates.csv", "r") as f:
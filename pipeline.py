@@ -0,0 +1,185 @@
+# pipeline.py
+# Event-driven closed loop: ingest -> retrain -> reprice.
+# Watches UnstructuredDocument and ExternalDiseaseRate for new rows and runs the
+# existing scripts as stages, so prices follow new data within seconds.
+# Repricing only runs once per new model version, so repeated bursts of data
+# never compound the pricing factor.
+#
+# Run:
+#   python pipeline.py          (watch forever)
+#   python pipeline.py --once   (run the stages once if there is new data, then exit)
+
+import argparse
+import asyncio
+import json
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+DB_PATH = "insurance.db"
+STATE_PATH = Path("predictive_module/pipeline_state.json")
+MODEL_STATE_PATH = Path("predictive_module/model_state.json")
+
+POLL_INTERVAL = 1.0   # seconds between PRAGMA data_version checks
+DEBOUNCE = 3.0        # seconds of quiet after the last new row before running
+MAX_WAIT = 30.0       # run anyway once a burst has lasted this long
+RETRY_BACKOFF = 5.0   # first retry delay after a failed run, doubled per failure
+MAX_BACKOFF = 300.0
+
+# High-water marks: new rows always get a larger AUTOINCREMENT id.
+WATERMARK_QUERIES = {
+    "UnstructuredDocument": "SELECT COALESCE(MAX(doc_id), 0) FROM UnstructuredDocument",
+    "ExternalDiseaseRate": "SELECT COALESCE(MAX(rate_id), 0) FROM ExternalDiseaseRate",
+}
+
+# train_or_retrain decides on its own whether a retrain is needed (and exits 0
+# when it skips); apply_pricing_update computes and applies the factor itself.
+RETRAIN_SCRIPT = "predictive_module/train_or_retrain.py"
+REPRICE_SCRIPT = "apply_pricing_update.py"
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+def load_state():
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    return {"watermarks": {}, "repriced_model_version": None}
+
+def save_state(state: dict):
+    STATE_PATH.write_text(json.dumps(state, indent=2), encoding="utf-8")
+
+def read_model_version():
+    if not MODEL_STATE_PATH.exists():
+        return None
+    return json.loads(MODEL_STATE_PATH.read_text(encoding="utf-8")).get("model_version")
+
+def read_watermarks(conn) -> dict:
+    return {table: conn.execute(sql).fetchone()[0] for table, sql in WATERMARK_QUERIES.items()}
+
+def changed_tables(marks: dict, state: dict) -> set:
+    done = state["watermarks"]
+    return {table for table, mark in marks.items() if mark > done.get(table, 0)}
+
+async def run_stage(name, script):
+    # Stages run as separate processes: the event loop never blocks on model
+    # loading or training, and each script keeps its own connection handling.
+    log(f"stage {name}: {script}")
+    proc = await asyncio.create_subprocess_exec(sys.executable, script)
+    rc = await proc.wait()
+    if rc != 0:
+        log(f"stage {name} failed (exit code {rc})")
+    return rc == 0
+
+async def run_pipeline(marks: dict, state: dict) -> bool:
+    # Returns False if a stage failed; the watermarks are then left alone so
+    # the caller's retry processes the same data again.
+    changed = changed_tables(marks, state)
+    if not changed:
+        return True
+    log(f"new data in {sorted(changed)}")
+    if not await run_stage("retrain", RETRAIN_SCRIPT):
+        return False
+
+    # Reprice once per model version. Tracking the repriced version (rather
+    # than "did this run retrain") also covers a reprice that failed after a
+    # successful retrain in an earlier run.
+    model_version = read_model_version()
+    if model_version is None or model_version == state.get("repriced_model_version"):
+        log(f"no new model version (v{model_version}); skipping reprice")
+    else:
+        if not await run_stage("reprice", REPRICE_SCRIPT):
+            return False
+        state["repriced_model_version"] = model_version
+
+    state["watermarks"] = marks
+    save_state(state)
+    log("pipeline complete")
+    return True
+
+async def watch(conn, latest: dict, wake: asyncio.Event):
+    # PRAGMA data_version only changes when another connection commits, so
+    # idle polls cost one pragma instead of the watermark queries.
+    loop = asyncio.get_running_loop()
+    last_version = None
+    last_change = None
+    burst_start = None
+    while True:
+        try:
+            version = conn.execute("PRAGMA data_version;").fetchone()[0]
+            marks = read_watermarks(conn) if version != last_version else None
+        except sqlite3.OperationalError as e:
+            # e.g. "database is locked" during a long writer commit: poll again.
+            log(f"watch: {e}; retrying")
+            await asyncio.sleep(POLL_INTERVAL)
+            continue
+
+        if marks is not None:
+            last_version = version
+            if marks != latest:
+                latest.update(marks)
+                last_change = loop.time()
+                if burst_start is None:
+                    burst_start = last_change
+
+        # Debounce: a burst of ingests becomes a single run once it settles,
+        # or after MAX_WAIT so a steady trickle cannot postpone it forever.
+        if last_change is not None:
+            now = loop.time()
+            if now - last_change >= DEBOUNCE or now - burst_start >= MAX_WAIT:
+                last_change = None
+                burst_start = None
+                wake.set()
+
+        await asyncio.sleep(POLL_INTERVAL)
+
+async def run_forever(conn, state: dict):
+    latest = read_watermarks(conn)
+    wake = asyncio.Event()
+    if changed_tables(latest, state):
+        wake.set()
+    watcher = asyncio.create_task(watch(conn, latest, wake))
+    log(f"watching {DB_PATH} (watermarks={latest})")
+    loop = asyncio.get_running_loop()
+    backoff = RETRY_BACKOFF
+    try:
+        while True:
+            # Wait on the watcher too, so an unexpected error in it surfaces
+            # here instead of leaving the loop waiting on wake forever.
+            waiter = asyncio.create_task(wake.wait())
+            done, _ = await asyncio.wait({waiter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+            if watcher in done:
+                waiter.cancel()
+                watcher.result()
+                raise RuntimeError("watcher stopped unexpectedly")
+            wake.clear()
+            # Anything arriving while the stages run sets wake again, so
+            # overlapping bursts are coalesced into one follow-up run.
+            if await run_pipeline(dict(latest), state):
+                backoff = RETRY_BACKOFF
+            else:
+                log(f"retrying in {backoff:.0f}s")
+                loop.call_later(backoff, wake.set)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+    finally:
+        watcher.cancel()
+
+def main(once=False):
+    conn = sqlite3.connect(DB_PATH)
+    state = load_state()
+    try:
+        if once:
+            if not asyncio.run(run_pipeline(read_watermarks(conn), state)):
+                sys.exit(1)
+        else:
+            asyncio.run(run_forever(conn, state))
+    except KeyboardInterrupt:
+        log("stopped")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch for new data and run retrain/reprice.")
+    parser.add_argument("--once", action="store_true", help="run once if there is new data, then exit")
+    args = parser.parse_args()
+    main(once=args.once)
@@ -0,0 +1,118 @@
+# compact_scorer.py
+# Pure-NumPy scorer for the compact model written by train_or_retrain.py.
+# Reproduces TfidfVectorizer(ngram_range=(1, 2)) + LogisticRegression.predict_proba
+# without importing scikit-learn or unpickling any objects.
+#
+# Artifact layout (models/risk_model_compact.npz, no pickled objects):
+#   terms      sorted vocabulary, position i is feature i
+#   idf        float32 idf weight per feature
+#   coef       float32 coefficients, or int8 when quantized (times coef_scale)
+#   coef_scale float32 scalar, 1.0 when not quantized
+#   intercept  float32 scalar
+#   ngram_max  int, upper end of the ngram range
+
+import re
+from pathlib import Path
+
+import numpy as np
+
+COMPACT_PATH = Path("models/risk_model_compact.npz")
+
+# TfidfVectorizer defaults: lowercase, token_pattern r"(?u)\b\w\w+\b"
+TOKEN_RE = re.compile(r"(?u)\b\w\w+\b")
+
+# Vectorizer settings predict_proba reproduces. Vocabulary-shaping options
+# (min_df, max_df, max_features, smooth_idf) are baked into terms/idf.
+REQUIRED_VECTORIZER_PARAMS = {
+    "input": "content",
+    "analyzer": "word",
+    "lowercase": True,
+    "preprocessor": None,
+    "tokenizer": None,
+    "token_pattern": TOKEN_RE.pattern,
+    "strip_accents": None,
+    "stop_words": None,
+    "binary": False,
+    "norm": "l2",
+    "use_idf": True,
+    "sublinear_tf": False,
+}
+
+def check_exportable(vectorizer, model):
+    # Fail loudly instead of exporting a model the compact scorer would get wrong.
+    params = vectorizer.get_params()
+    mismatched = {
+        k: params.get(k) for k, v in REQUIRED_VECTORIZER_PARAMS.items() if params.get(k) != v
+    }
+    if mismatched:
+        raise ValueError(f"Compact export does not support vectorizer settings: {mismatched}")
+    if params["ngram_range"][0] != 1:
+        raise ValueError(f"Compact export requires ngram_range starting at 1, got {params['ngram_range']}")
+    if model.coef_.shape[0] != 1:
+        raise ValueError("Compact export requires a binary classifier (one row of coef_).")
+
+def export_compact(vectorizer, model, path=COMPACT_PATH, quantize=False):
+    check_exportable(vectorizer, model)
+    vocab = vectorizer.vocabulary_
+    terms = sorted(vocab)
+    cols = np.fromiter((vocab[t] for t in terms), dtype=np.int64, count=len(terms))
+
+    coef = model.coef_[0][cols].astype(np.float32)
+    scale = np.float32(1.0)
+    if quantize:
+        max_abs = float(np.abs(coef).max()) if coef.size else 0.0
+        scale = np.float32(max_abs / 127.0 if max_abs > 0 else 1.0)
+        coef = np.round(coef / scale).astype(np.int8)
+
+    np.savez(
+        path,
+        terms=np.array(terms),
+        idf=vectorizer.idf_[cols].astype(np.float32),
+        coef=coef,
+        coef_scale=scale,
+        intercept=np.float32(model.intercept_[0]),
+        ngram_max=np.int64(vectorizer.ngram_range[1]),
+    )
+    return path
+
+def load_compact(path=COMPACT_PATH):
+    with np.load(path, allow_pickle=False) as z:
+        return {
+            "terms": z["terms"],
+            "idf": z["idf"],
+            "coef": z["coef"].astype(np.float32) * z["coef_scale"],
+            "intercept": float(z["intercept"]),
+            "ngram_max": int(z["ngram_max"]),
+        }
+
+def ngrams(text, ngram_max):
+    tokens = TOKEN_RE.findall(text.lower())
+    out = list(tokens)
+    for n in range(2, ngram_max + 1):
+        out.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return out
+
+def predict_proba(compact, texts):
+    # Probability of class 1 (high risk) per text.
+    terms = compact["terms"]
+    idf = compact["idf"]
+    coef = compact["coef"]
+    probs = np.empty(len(texts), dtype=np.float64)
+
+    for i, text in enumerate(texts):
+        score = compact["intercept"]
+        grams = ngrams(text, compact["ngram_max"])
+        if grams and terms.size:
+            # Own dtype width: casting to terms.dtype would truncate long ngrams.
+            grams, counts = np.unique(np.array(grams), return_counts=True)
+            pos = np.searchsorted(terms, grams)
+            pos[pos == terms.size] = 0
+            hit = terms[pos] == grams
+            pos = pos[hit]
+            w = counts[hit].astype(np.float64) * idf[pos]
+            norm = np.sqrt(np.dot(w, w))
+            if norm > 0:
+                score += float(np.dot(w / norm, coef[pos]))
+        probs[i] = 1.0 / (1.0 + np.exp(-score))
+
+    return probs
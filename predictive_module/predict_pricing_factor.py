@@ -1,6 +1,9 @@
 import sqlite3
+from datetime import datetime
 from pathlib import Path
-from joblib import load
+
+from compact_scorer import COMPACT_PATH, load_compact, predict_proba
+from snapshot import SNAPSHOT_PATH, open_snapshot
 
 DB_PATH = "insurance.db"
 VEC_PATH = Path("models/tfidf.joblib")
@@ -10,8 +13,17 @@ def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
 def fetch_recent_docs(n=5):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    # Score the documents the model was trained on (the replica refreshed by
+    # train_or_retrain); fall back to the live database if there is none yet.
+    # Returns (rows, description of where they were read from).
+    if SNAPSHOT_PATH.exists():
+        taken = datetime.fromtimestamp(SNAPSHOT_PATH.stat().st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        source = f"snapshot {SNAPSHOT_PATH} taken {taken}"
+        conn = open_snapshot()
+    else:
+        source = f"live database {DB_PATH}"
+        conn = sqlite3.connect(DB_PATH)
+        conn.execute("PRAGMA foreign_keys = ON;")
     cur = conn.cursor()
     cur.execute("""
         SELECT doc_id, storage_location, timestamp
@@ -21,7 +33,7 @@ def fetch_recent_docs(n=5):
     """, (n,))
     rows = cur.fetchall()
     conn.close()
-    return rows
+    return rows, source
 
 def read_text(path_str: str) -> str:
     p = Path(path_str)
@@ -30,14 +42,12 @@ def read_text(path_str: str) -> str:
     return p.read_text(encoding="utf-8", errors="ignore")
 
 def main():
-    if not VEC_PATH.exists() or not MODEL_PATH.exists():
+    # Either the compact export or the joblib pair is enough to score.
+    if not COMPACT_PATH.exists() and not (VEC_PATH.exists() and MODEL_PATH.exists()):
         print("❌ Model artifacts not found. Run: python predictive_module/train_or_retrain.py")
         return
 
-    vectorizer = load(VEC_PATH)
-    model = load(MODEL_PATH)
-
-    docs = fetch_recent_docs(5)
+    docs, source = fetch_recent_docs(5)
     texts = []
     used_docs = []
 
@@ -51,19 +61,28 @@ def main():
         print("❌ No readable recent text documents found.")
         return
 
-    X = vectorizer.transform(texts)
     # probability of class 1 (high risk)
-    probs = model.predict_proba(X)[:, 1]
+    if COMPACT_PATH.exists():
+        probs = predict_proba(load_compact(COMPACT_PATH), texts)
+    else:
+        from joblib import load
+        vectorizer = load(VEC_PATH)
+        model = load(MODEL_PATH)
+        probs = model.predict_proba(vectorizer.transform(texts))[:, 1]
     avg_risk = float(probs.mean())
 
     # Map avg_risk to pricing factor (1.00 to 1.25)
     factor = 1.0 + clamp(avg_risk, 0.0, 0.25)
 
     print("✅ Predictive pricing factor computed from unstructured documents")
+    print(f"Docs read from: {source}")
     print(f"Docs used: {used_docs}")
     print(f"Average high-risk probability: {avg_risk:.3f}")
     print(f"Pricing factor: {factor:.3f}")
     print("Use this factor in Step 4 to update Product.base_price.")
+    if source.startswith("snapshot"):
+        print("Note: apply_pricing_update.py reads the live database; documents ingested")
+        print("after the snapshot can make the applied factor differ from this one.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,69 @@
+# snapshot.py
+# Point-in-time, read-only replica of insurance.db for training and analytics,
+# so long reads never hold locks on the production database.
+#
+# Run:
+#   python predictive_module/snapshot.py
+#
+# The replica is built with the sqlite3 online backup API, a few pages per step,
+# into a temporary file that is then atomically renamed over the old replica.
+# Readers that already have the old replica open keep their (unlinked) copy,
+# which is what makes it safe to open replicas with immutable=1.
+
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+DB_PATH = "insurance.db"
+SNAPSHOT_PATH = Path("snapshots/insurance_ro.db")
+
+PAGES_PER_STEP = 256            # pages copied per backup step
+STEP_SLEEP = 0.005              # seconds yielded to writers between steps
+MMAP_SIZE = 256 * 1024 * 1024   # bytes mapped when reading the replica
+
+def refresh_snapshot(src_path=DB_PATH, dest_path=SNAPSHOT_PATH,
+                     pages=PAGES_PER_STEP, sleep=STEP_SLEEP, progress=None):
+    # progress(status, remaining, total) is called after every step.
+    # If the source is written to mid-copy, SQLite restarts the backup, so the
+    # result is always a consistent snapshot of a single point in time.
+    dest = Path(dest_path)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(dest.name + ".tmp")
+    if tmp.exists():
+        tmp.unlink()
+
+    src = sqlite3.connect(f"{Path(src_path).resolve().as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(tmp)
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+    finally:
+        dst.close()
+        src.close()
+
+    os.replace(tmp, dest)
+    return dest
+
+def open_snapshot(path=SNAPSHOT_PATH, mmap_size=MMAP_SIZE):
+    # immutable=1 skips all locking and change detection; only valid because
+    # refresh_snapshot never modifies a replica in place.
+    path = Path(path)
+    if not path.exists():
+        raise FileNotFoundError(f"Snapshot not found: {path}. Run predictive_module/snapshot.py first.")
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro&immutable=1", uri=True)
+    conn.execute(f"PRAGMA mmap_size = {int(mmap_size)};")
+    return conn
+
+def print_progress(status, remaining, total):
+    done = total - remaining
+    pct = 100.0 * done / total if total else 100.0
+    print(f"\rSnapshot: {done}/{total} pages ({pct:.0f}%)", end="", file=sys.stderr, flush=True)
+
+def main():
+    dest = refresh_snapshot(progress=print_progress)
+    print(file=sys.stderr)
+    print("✅ Read-only snapshot refreshed")
+    print(f"Replica: {dest.resolve()}")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@ from joblib import dump
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
 
+from compact_scorer import check_exportable, export_compact
+from snapshot import refresh_snapshot, open_snapshot
+
 DB_PATH = "insurance.db"
 MODELS_DIR = Path("models")
 STATE_PATH = Path("predictive_module/model_state.json")
@@ -46,11 +49,18 @@ def weak_label(text: str) -> int:
     t = text.lower()
     return 1 if any(k in t for k in HIGH_RISK_KEYWORDS) else 0
 
-from typing import Optional
-def has_new_data(docs: List[Tuple[int, str, str]], last_ts: Optional[str]) -> bool:
-    if not docs:
+def newest_document_timestamp() -> Optional[str]:
+    # Cheap check on the live database (index seek on IX_UnstructuredDocument_Time),
+    # so runs that skip retraining never pay for a snapshot.
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute("SELECT MAX(timestamp) FROM UnstructuredDocument").fetchone()[0]
+    finally:
+        conn.close()
+
+def has_new_data(newest: Optional[str], last_ts: Optional[str]) -> bool:
+    if newest is None:
         return False
-    newest = docs[-1][2]  # timestamp string
     if last_ts is None:
         return True
     # ISO-like strings compare well lexicographically if consistent format
@@ -60,22 +70,24 @@ def main():
     ensure_dirs()
     state = load_state()
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cur = conn.cursor()
-
-    docs = fetch_documents(cur)
-    conn.close()
-
-    if not docs:
+    newest = newest_document_timestamp()
+    if newest is None:
         print("❌ No documents found in UnstructuredDocument. Ingest some .txt first.")
         return
 
-    if not has_new_data(docs, state["last_trained_timestamp"]):
+    if not has_new_data(newest, state["last_trained_timestamp"]):
         print("✅ No new unstructured documents since last training. Skipping retrain.")
         print(f"Last trained timestamp: {state['last_trained_timestamp']}")
         return
 
+    # Train against a fresh point-in-time replica rather than the live database.
+    refresh_snapshot(DB_PATH)
+    conn = open_snapshot()
+    cur = conn.cursor()
+
+    docs = fetch_documents(cur)
+    conn.close()
+
     texts = []
     labels = []
     usable = 0
@@ -99,8 +111,14 @@ def main():
     model = LogisticRegression(max_iter=1000)
     model.fit(X, labels)
 
+    # Validate before writing anything: a failed compact export must not leave
+    # new joblib files next to a stale compact model that scoring prefers.
+    check_exportable(vectorizer, model)
+
     dump(vectorizer, MODELS_DIR / "tfidf.joblib")
     dump(model, MODELS_DIR / "risk_model.joblib")
+    # Flat NumPy export for the scoring path (see compact_scorer.py).
+    export_compact(vectorizer, model, MODELS_DIR / "risk_model_compact.npz")
 
     # Update state
     newest_ts = docs[-1][2]
@@ -112,7 +130,7 @@ def main():
     print(f"Usable documents: {usable}")
     print(f"Last trained timestamp set to: {newest_ts}")
     print(f"Model version: v{state['model_version']}")
-    print("Saved: models/tfidf.joblib, models/risk_model.joblib, predictive_module/model_state.json")
+    print("Saved: models/tfidf.joblib, models/risk_model.joblib, models/risk_model_compact.npz, predictive_module/model_state.json")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,116 @@
+# price_history.py
+# Point-in-time pricing backed by the ProductPriceHistory temporal table.
+# Each row covers the half-open interval [valid_from, valid_to); valid_to IS NULL
+# marks the current price. Lookups seek IX_ProductPriceHistory_Product_From.
+#
+# Run:
+#   python3 price_history.py 1 "2025-06-01"
+# args: <product_id> <as_of: 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM:SS'>
+
+import sys
+
+from schema import connect
+
+DB_PATH = "insurance.db"
+
+def record_price_change(conn, product_id, old_price, new_price, changed_at, model_version=None):
+    # Must run inside the caller's write transaction so the history and
+    # Product.base_price can never disagree.
+    has_history = conn.execute(
+        "SELECT 1 FROM ProductPriceHistory WHERE product_id=? LIMIT 1", (product_id,)
+    ).fetchone()
+    if not has_history:
+        # First recorded change for a product created after the history
+        # migration. Every reprice since then writes history, so there are no
+        # pricing notes to seed from: old_price has held since effective_from.
+        conn.execute("""
+            INSERT INTO ProductPriceHistory(product_id, valid_from, valid_to, price, model_version)
+            SELECT product_id, COALESCE(effective_from, ?), NULL, ?, NULL
+            FROM Product WHERE product_id=?
+        """, (changed_at, old_price, product_id))
+
+    conn.execute("""
+        UPDATE ProductPriceHistory SET valid_to=?
+        WHERE product_id=? AND valid_to IS NULL
+    """, (changed_at, product_id))
+
+    conn.execute("""
+        INSERT INTO ProductPriceHistory(product_id, valid_from, valid_to, price, model_version)
+        VALUES (?, ?, NULL, ?, ?)
+    """, (product_id, changed_at, new_price, model_version))
+
+def price_as_of(conn, product_id, as_of):
+    # Interval containing as_of; a single seek on the covering index.
+    # Bare dates compare as midnight ('2025-06-01' < '2025-06-01 09:00:00').
+    # The valid_to filter also skips zero-length intervals left by two
+    # updates within the same second.
+    row = conn.execute("""
+        SELECT price, model_version
+        FROM ProductPriceHistory
+        WHERE product_id=? AND valid_from <= ?
+          AND (valid_to IS NULL OR valid_to > ?)
+        ORDER BY valid_from DESC
+        LIMIT 1
+    """, (product_id, as_of, as_of)).fetchone()
+    if row is None:
+        # A product that was never repriced has no history rows: its
+        # base_price has been in force since effective_from.
+        row = conn.execute("""
+            SELECT p.base_price, NULL
+            FROM Product p
+            WHERE p.product_id=? AND p.base_price IS NOT NULL
+              AND (p.effective_from IS NULL OR p.effective_from <= ?)
+              AND NOT EXISTS (SELECT 1 FROM ProductPriceHistory h WHERE h.product_id = p.product_id)
+        """, (product_id, as_of)).fetchone()
+    return row
+
+def policy_prices_as_of_issue(conn, policy_ids=None):
+    # Bulk re-rating: the price each policy's product had on its issue_date.
+    # The correlated subquery is one index seek per policy, so cost grows
+    # with the number of policies, not with the size of the history.
+    # Products without history fall back to base_price, as in price_as_of.
+    sql = """
+        SELECT p.policy_id, p.product_id, p.issue_date,
+            COALESCE(
+                (SELECT h.price
+                 FROM ProductPriceHistory h
+                 WHERE h.product_id = p.product_id
+                   AND h.valid_from <= p.issue_date
+                   AND (h.valid_to IS NULL OR h.valid_to > p.issue_date)
+                 ORDER BY h.valid_from DESC
+                 LIMIT 1),
+                (SELECT pr.base_price
+                 FROM Product pr
+                 WHERE pr.product_id = p.product_id
+                   AND (pr.effective_from IS NULL OR pr.effective_from <= p.issue_date)
+                   AND NOT EXISTS (SELECT 1 FROM ProductPriceHistory h2 WHERE h2.product_id = p.product_id))
+            ) AS price_as_of
+        FROM Policy p
+    """
+    params = ()
+    if policy_ids is not None:
+        policy_ids = list(policy_ids)
+        if not policy_ids:
+            return []
+        sql += f" WHERE p.policy_id IN ({','.join('?' * len(policy_ids))})"
+        params = tuple(policy_ids)
+    return conn.execute(sql + " ORDER BY p.policy_id", params).fetchall()
+
+def main(product_id: int, as_of: str):
+    conn = connect(DB_PATH)
+    try:
+        result = price_as_of(conn, product_id, as_of)
+    finally:
+        conn.close()
+
+    if result is None:
+        print(f"No recorded price for product_id={product_id} as of {as_of}.")
+        return
+    price, model_version = result
+    print(f"Product {product_id} price as of {as_of}: {price} (model_version={model_version})")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 price_history.py <product_id> <as_of>")
+        sys.exit(1)
+    main(int(sys.argv[1]), sys.argv[2])
@@ -3,15 +3,15 @@
 #   python3 purchase_policy.py 1 1
 # args: <customer_id> <product_id>
 
-import sqlite3
 import sys
 from datetime import datetime, date, timedelta
 
+from schema import connect
+
 DB_PATH = "insurance.db"
 
 def main(customer_id: int, product_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = connect(DB_PATH)
     cur = conn.cursor()
 
     # Read current base_price
@@ -1,17 +1,40 @@
 # quote.py
 # Run:
 #   python3 quote.py 1 1
-# args: <customer_id> <product_id>
+#   python3 quote.py 1 1 "2025-06-01"
+# args: <customer_id> <product_id> [as_of]
+# With as_of, the quote uses the price in force at that time (ProductPriceHistory).
+#
+# Batch mode:
+#   python3 quote.py --batch quotes.jsonl [as_of]   ('-' reads stdin)
+# Each input line is {"customer_id": ..., "product_id": ...}; one JSON result
+# per non-blank line is written to stdout, in input order. Malformed lines get
+# {"line": n, "error": ...} and the rest of the batch is still quoted.
 
-import sqlite3
+import json
 import sys
 from datetime import datetime
+from itertools import islice
+
+from price_history import price_as_of
+from schema import connect
 
 DB_PATH = "insurance.db"
 
-def main(customer_id: int, product_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA foreign_keys = ON;")
+BATCH_SIZE = 5000   # pairs priced and logged per transaction
+IN_CHUNK = 900      # stay under SQLite's bound-parameter limit
+
+def fetch_by_ids(conn, sql, ids):
+    # sql has a single "{ids}" placeholder for the IN list.
+    ids = list(ids)
+    rows = []
+    for i in range(0, len(ids), IN_CHUNK):
+        chunk = ids[i:i + IN_CHUNK]
+        rows.extend(conn.execute(sql.format(ids=",".join("?" * len(chunk))), chunk))
+    return rows
+
+def main(customer_id: int, product_id: int, as_of=None):
+    conn = connect(DB_PATH)
     cur = conn.cursor()
 
     cur.execute("""
@@ -24,6 +47,14 @@ def main(customer_id: int, product_id: int):
         raise ValueError("Product not found.")
     name, price, status = row
 
+    price_label = "base_price"
+    if as_of is not None:
+        historical = price_as_of(conn, product_id, as_of)
+        if historical is None:
+            raise ValueError(f"No recorded price for product_id={product_id} as of {as_of}.")
+        price = historical[0]
+        price_label = f"price as of {as_of}"
+
     # Log quote event
     cur.execute("""
         INSERT INTO Activity(policy_id, customer_id, activity_type, activity_timestamp, notes)
@@ -32,7 +63,7 @@ def main(customer_id: int, product_id: int):
         1,  # demo policy_id placeholder (or NULL if you later allow it)
         customer_id,
         datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-        f"Quote generated for product_id={product_id} ({name}). base_price={price}."
+        f"Quote generated for product_id={product_id} ({name}). {price_label}={price}."
     ))
 
     conn.commit()
@@ -41,10 +72,115 @@ def main(customer_id: int, product_id: int):
     print("=== QUOTE ===")
     print(f"Customer ID: {customer_id}")
     print(f"Product: {name} (status={status})")
-    print(f"Quoted Price (base_price): {price}")
+    print(f"Quoted Price ({price_label}): {price}")
+
+def quote_batch(conn, pairs, as_of=None):
+    # pairs: list of (customer_id, product_id). Returns one result dict per pair.
+    products = {
+        pid: (name, price, status)
+        for pid, name, price, status in fetch_by_ids(conn, """
+            SELECT product_id, product_name, base_price, status
+            FROM Product WHERE product_id IN ({ids})
+        """, {pid for _, pid in pairs})
+    }
+    customers = {
+        cid for (cid,) in fetch_by_ids(conn, """
+            SELECT customer_id FROM Customer WHERE customer_id IN ({ids})
+        """, {cid for cid, _ in pairs})
+    }
+
+    price_label = "base_price"
+    if as_of is not None:
+        price_label = f"price as of {as_of}"
+        for pid, (name, _, status) in list(products.items()):
+            historical = price_as_of(conn, pid, as_of)
+            products[pid] = (name, historical[0] if historical else None, status)
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    results = []
+    activities = []
+    for customer_id, product_id in pairs:
+        product = products.get(product_id)
+        if product is None:
+            results.append({"customer_id": customer_id, "product_id": product_id, "error": "Product not found."})
+            continue
+        if customer_id not in customers:
+            results.append({"customer_id": customer_id, "product_id": product_id, "error": "Customer not found."})
+            continue
+        name, price, status = product
+        if price is None:
+            results.append({"customer_id": customer_id, "product_id": product_id, "error": f"No {price_label}."})
+            continue
+
+        results.append({
+            "customer_id": customer_id,
+            "product_id": product_id,
+            "product_name": name,
+            "status": status,
+            "price": price,
+        })
+        activities.append((
+            1,  # demo policy_id placeholder, as in main()
+            customer_id,
+            now,
+            f"Quote generated for product_id={product_id} ({name}). {price_label}={price}.",
+        ))
+
+    conn.executemany("""
+        INSERT INTO Activity(policy_id, customer_id, activity_type, activity_timestamp, notes)
+        VALUES (?, ?, 'QuoteGenerated', ?, ?)
+    """, activities)
+    conn.commit()
+    return results
+
+def parse_id(value):
+    # Integers or strings of ASCII digits only: int() would silently turn
+    # 1.7 or true into 1 and quote a different customer.
+    if type(value) is int:
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    raise ValueError(f"invalid id {value!r}")
+
+def read_pairs(lines):
+    # Yields (line_no, (customer_id, product_id) or None, error or None).
+    for n, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+            yield n, (parse_id(req["customer_id"]), parse_id(req["product_id"])), None
+        except KeyError as e:
+            yield n, None, f"Missing field {e}."
+        except (ValueError, TypeError) as e:
+            yield n, None, f"Malformed request: {e}"
+
+def main_batch(path: str, as_of=None, out=sys.stdout):
+    conn = connect(DB_PATH)
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        items = read_pairs(f)
+        while True:
+            batch = list(islice(items, BATCH_SIZE))
+            if not batch:
+                break
+            quoted = iter(quote_batch(conn, [pair for _, pair, _ in batch if pair is not None], as_of))
+            for n, pair, error in batch:
+                result = next(quoted) if pair is not None else {"line": n, "error": error}
+                out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+        conn.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python3 quote.py <customer_id> <product_id>")
+    if len(sys.argv) in (3, 4) and sys.argv[1] == "--batch":
+        main_batch(sys.argv[2], sys.argv[3] if len(sys.argv) == 4 else None)
+        sys.exit(0)
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python3 quote.py <customer_id> <product_id> [as_of]")
+        print("       python3 quote.py --batch <pairs.jsonl|-> [as_of]")
         sys.exit(1)
-    main(int(sys.argv[1]), int(sys.argv[2]))
+    main(int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] if len(sys.argv) == 4 else None)
@@ -1,12 +1,35 @@
 # schema.py
-# Creates the project schema in a local SQLite database (insurance.db).
+# Creates the project schema in a local SQLite database (insurance.db) and
+# migrates existing databases to the current version (PRAGMA user_version).
 # Run: python schema.py
 
+import re
 import sqlite3
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
 
 DB_PATH = Path("insurance.db")
 
+# Pricing history (temporal, half-open [valid_from, valid_to)); written by apply_pricing_update.
+PRICE_HISTORY_DDL = """
+    CREATE TABLE IF NOT EXISTS ProductPriceHistory (
+        history_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id    INTEGER NOT NULL,
+        valid_from    TEXT NOT NULL,   -- ISO8601 'YYYY-MM-DD HH:MM:SS'
+        valid_to      TEXT,            -- NULL = current price
+        price         NUMERIC NOT NULL,
+        model_version TEXT,            -- NULL for prices not set by the model
+        FOREIGN KEY (product_id) REFERENCES Product(product_id)
+            ON UPDATE CASCADE
+            ON DELETE CASCADE
+    );
+    """
+
+# Covering index for "price as of" seeks: product_id = ? AND valid_from <= ? ORDER BY valid_from DESC
+PRICE_HISTORY_INDEX = "CREATE INDEX IF NOT EXISTS IX_ProductPriceHistory_Product_From ON ProductPriceHistory(product_id, valid_from, valid_to, price, model_version);"
+
 DDL_STATEMENTS = [
     # Important: SQLite requires PRAGMA foreign_keys = ON per connection to enforce FKs.
 
@@ -155,6 +178,8 @@ DDL_STATEMENTS = [
     );
     """,
 
+    PRICE_HISTORY_DDL,
+
     # Polymorphic link table: cannot enforce entity_id as FK because entity_type varies.
     """
     CREATE TABLE IF NOT EXISTS DocumentLink (
@@ -178,25 +203,230 @@ INDEX_STATEMENTS = [
     "CREATE INDEX IF NOT EXISTS IX_Activity_Policy_Time ON Activity(policy_id, activity_timestamp);",
     "CREATE INDEX IF NOT EXISTS IX_DocumentLink_Entity ON DocumentLink(entity_type, entity_id, doc_id);",
     "CREATE INDEX IF NOT EXISTS IX_UnstructuredDocument_Time ON UnstructuredDocument(timestamp);",
+    PRICE_HISTORY_INDEX,
 ]
 
-def create_schema(db_path: Path) -> None:
-    conn = sqlite3.connect(db_path)
+# -------------------------------
+# Versioned migrations (PRAGMA user_version)
+# -------------------------------
+# Every step is idempotent and commits in its own short write transaction, so
+# a crashed or concurrent migration can simply be re-run. user_version is only
+# bumped once all steps of a migration have completed.
+
+BACKFILL_CHUNK = 1000   # rows per backfill transaction
+
+@contextmanager
+def write_transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE;")
     try:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        cur = conn.cursor()
+        yield conn
+    except Exception:
+        conn.execute("ROLLBACK;")
+        raise
+    conn.execute("COMMIT;")
 
+def create_tables(conn: sqlite3.Connection) -> None:
+    with write_transaction(conn):
         for ddl in DDL_STATEMENTS:
-            cur.execute(ddl)
+            conn.execute(ddl)
+
+def create_indexes(conn: sqlite3.Connection) -> None:
+    # One index per transaction: the write lock is held for a single build.
+    for idx in INDEX_STATEMENTS:
+        with write_transaction(conn):
+            conn.execute(idx)
+
+def add_column(table: str, column: str, decl: str):
+    def step(conn: sqlite3.Connection) -> None:
+        with write_transaction(conn):
+            cols = {r[1] for r in conn.execute(f"PRAGMA table_info({table});")}
+            if column not in cols:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl};")
+    return step
+
+def create_price_history(conn: sqlite3.Connection) -> None:
+    with write_transaction(conn):
+        conn.execute(PRICE_HISTORY_DDL)
+        conn.execute(PRICE_HISTORY_INDEX)
+
+# Before ProductPriceHistory existed, price changes were only logged as
+# Activity notes written by apply_pricing_update, e.g.
+#   "Predictive pricing update (v1). ... Applied factor=1.250 to Product
+#    'Standard Health Plan' base_price: 200 -> 250.0."
+PRICING_NOTE_RE = re.compile(
+    r"^Predictive pricing update \((?P<model>[^)]*)\)\..* from docs=(?P<docs>\[[^\]]*\])\."
+    r".* to Product '(?P<name>.*)' base_price: (?P<old>\S+) -> (?P<new>\S+)\.$"
+)
 
-        for idx in INDEX_STATEMENTS:
-            cur.execute(idx)
+def pricing_changes_from_notes(conn: sqlite3.Connection) -> dict:
+    # product_name -> [(timestamp, old_price, new_price, model_version, docs), ...]
+    # Activity has no product_id, so the notes identify products by name.
+    changes = defaultdict(list)
+    for ts, notes in conn.execute("""
+        SELECT activity_timestamp, notes FROM Activity
+        WHERE activity_type = 'PricingUpdatedByPredictiveModel'
+        ORDER BY activity_timestamp, activity_id
+    """):
+        m = PRICING_NOTE_RE.match(notes or "")
+        if m:
+            changes[m["name"]].append((ts, float(m["old"]), float(m["new"]), m["model"], m["docs"]))
+    return changes
 
+def seed_price_history(conn: sqlite3.Connection, product_id: int, current_price, changes: dict, now: str) -> None:
+    # Open the first history intervals of a product that has none, ending with
+    # an open interval at current_price. Changes come from the Activity notes;
+    # a product with no logged change has had its price since effective_from.
+    name, effective_from = conn.execute(
+        "SELECT product_name, effective_from FROM Product WHERE product_id=?", (product_id,)
+    ).fetchone()
+    shared_name = conn.execute(
+        "SELECT COUNT(*) > 1 FROM Product WHERE product_name=?", (name,)
+    ).fetchone()[0]
+
+    rows = []
+    if shared_name:
+        # Notes cannot be attributed; only the current price is known, from now on.
+        rows.append((now, None, current_price, None))
+    elif not changes.get(name):
+        rows.append((effective_from or now, None, current_price, None))
+    else:
+        logged = changes[name]
+        first_ts, first_old = logged[0][0], logged[0][1]
+        start = min(effective_from, first_ts) if effective_from else first_ts
+        rows.append((start, first_ts, first_old, None))
+        for i, (ts, _, new, model, _) in enumerate(logged):
+            valid_to = logged[i + 1][0] if i + 1 < len(logged) else None
+            rows.append((ts, valid_to, new, model))
+        if float(current_price) != logged[-1][2]:
+            # Changed outside the model after the last note; time unknown.
+            rows[-1] = rows[-1][:1] + (now,) + rows[-1][2:]
+            rows.append((now, None, current_price, None))
+
+    conn.executemany("""
+        INSERT INTO ProductPriceHistory(product_id, valid_from, valid_to, price, model_version)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(product_id,) + r for r in rows])
+
+def backfill_price_history(conn: sqlite3.Connection) -> None:
+    # Seed history for every priced product that has none yet, from the
+    # Activity notes (parsed once), walking product_id in chunks so writers
+    # are never blocked for long.
+    changes = pricing_changes_from_notes(conn)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    last_id = 0
+    while True:
+        with write_transaction(conn):
+            rows = conn.execute("""
+                SELECT p.product_id, p.base_price
+                FROM Product p
+                WHERE p.product_id > ?
+                  AND p.base_price IS NOT NULL
+                  AND NOT EXISTS (SELECT 1 FROM ProductPriceHistory h WHERE h.product_id = p.product_id)
+                ORDER BY p.product_id
+                LIMIT ?
+            """, (last_id, BACKFILL_CHUNK)).fetchall()
+            if not rows:
+                return
+            for product_id, base_price in rows:
+                seed_price_history(conn, product_id, base_price, changes, now)
+        last_id = rows[-1][0]
+
+def backfill_last_repriced_by(conn: sqlite3.Connection) -> None:
+    # Products repriced before the marker existed get the key of their latest
+    # logged reprice (same format apply_pricing_update writes), so the first
+    # run after upgrading does not apply those inputs a second time.
+    changes = pricing_changes_from_notes(conn)
+    last_id = 0
+    while True:
+        with write_transaction(conn):
+            rows = conn.execute("""
+                SELECT p.product_id, p.product_name,
+                       (SELECT COUNT(*) FROM Product q WHERE q.product_name = p.product_name)
+                FROM Product p
+                WHERE p.product_id > ? AND p.last_repriced_by IS NULL
+                ORDER BY p.product_id
+                LIMIT ?
+            """, (last_id, BACKFILL_CHUNK)).fetchall()
+            if not rows:
+                return
+            for product_id, name, same_name in rows:
+                # Notes identify products by name; skip names they cannot attribute.
+                if same_name == 1 and changes.get(name):
+                    _, _, _, model, docs = changes[name][-1]
+                    conn.execute(
+                        "UPDATE Product SET last_repriced_by=? WHERE product_id=?",
+                        (f"{model} docs={docs}", product_id),
+                    )
+        last_id = rows[-1][0]
+
+# (user_version, description, steps)
+MIGRATIONS = [
+    (1, "baseline tables and indexes", [create_tables, create_indexes]),
+    (2, "Product.base_price and ExternalDiseaseRate.rate_value", [
+        add_column("Product", "base_price", "NUMERIC"),
+        add_column("ExternalDiseaseRate", "rate_value", "NUMERIC"),
+    ]),
+    # Product.version backs optimistic concurrency for repricing: every
+    # base_price write must bump it, and writers compare-and-set on it.
+    (3, "Product.version", [add_column("Product", "version", "INTEGER NOT NULL DEFAULT 0")]),
+    (4, "ProductPriceHistory", [create_price_history, backfill_price_history]),
+    # Product.last_repriced_by ('<model_version> docs=[...]') identifies the
+    # inputs of the last model reprice, so a concurrent or repeated reprice
+    # with the same inputs is skipped instead of compounding the factor.
+    (5, "Product.last_repriced_by", [
+        add_column("Product", "last_repriced_by", "TEXT"),
+        backfill_last_repriced_by,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection, verbose: bool = False) -> int:
+    # Returns the number of migrations applied.
+    if conn.in_transaction:
         conn.commit()
+    current = schema_version(conn)
+    applied = 0
+    for version, description, steps in MIGRATIONS:
+        if version <= current:
+            continue
+        if verbose:
+            print(f"Applying migration {version}: {description}")
+        for step in steps:
+            step(conn)
+        with write_transaction(conn):
+            # Another process may have finished this migration meanwhile.
+            if schema_version(conn) < version:
+                conn.execute(f"PRAGMA user_version = {int(version)};")
+        applied += 1
+    return applied
+
+def ensure_schema(conn: sqlite3.Connection) -> None:
+    # Startup fast path: a single pragma read when the schema is current.
+    if schema_version(conn) < SCHEMA_VERSION:
+        migrate(conn)
+
+def connect(db_path=DB_PATH, **kwargs) -> sqlite3.Connection:
+    # Shared connection setup. Statements are prepared once per connection and
+    # reused from sqlite3's statement cache, sized for every query in the app.
+    kwargs.setdefault("cached_statements", 256)
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute("PRAGMA foreign_keys = ON;")
+    ensure_schema(conn)
+    return conn
+
+def create_schema(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA foreign_keys = ON;")
+        migrate(conn, verbose=True)
     finally:
         conn.close()
 
 if __name__ == "__main__":
     create_schema(DB_PATH)
-    print(f"✅ Schema created/updated successfully at: {DB_PATH.resolve()}")
+    print(f"✅ Schema created/updated successfully at: {DB_PATH.resolve()} (version {SCHEMA_VERSION})")
     print("Tip: Use a SQLite viewer (e.g., DB Browser for SQLite) to inspect tables.")
@@ -2,13 +2,13 @@
 # Inserts baseline demo data into insurance.db so ML can modify it later
 # Run: python seed_data.py
 
-import sqlite3
 from datetime import date, timedelta
 
+from schema import connect
+
 DB_PATH = "insurance.db"
 
-conn = sqlite3.connect(DB_PATH)
-conn.execute("PRAGMA foreign_keys = ON;")
+conn = connect(DB_PATH)
 cur = conn.cursor()
 
 # -------------------------------
@@ -33,8 +33,8 @@ customer_id = cur.lastrowid
 # Insert Product
 # -------------------------------
 cur.execute("""
-INSERT INTO Product (product_name, effective_from, effective_to, status)
-VALUES ('Standard Health Plan', '2025-01-01', '2026-12-31', 'ACTIVE')
+INSERT INTO Product (product_name, effective_from, effective_to, status, base_price)
+VALUES ('Standard Health Plan', '2025-01-01', '2026-12-31', 'ACTIVE', 200.00)
 """)
 product_id = cur.lastrowid
 